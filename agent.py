@@ -4,8 +4,12 @@ Manages the multi-turn tool loop until Claude reaches a final answer.
 """
 import os
 import json
-from typing import Any
+import time
+import asyncio
+import contextlib
+from typing import Any, AsyncIterator
 import anthropic
+import httpx
 
 from tools.degree_requirements import get_degree_requirements, get_concentration_requirements
 from tools.course_search import (
@@ -19,11 +23,106 @@ from tools.bidding_history import get_bid_history, search_bidding_by_name
 # ---------------------------------------------------------------------------
 # Claude client
 # ---------------------------------------------------------------------------
-client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+# Sized for many concurrent chats: the httpx defaults (100 connections, 20
+# kept alive) cause pool waits and reconnect churn under bursty load. HTTP/2
+# lets in-flight requests share connections to api.anthropic.com.
+HTTP_LIMITS = httpx.Limits(max_connections=500, max_keepalive_connections=200, keepalive_expiry=60)
+
+_client: anthropic.AsyncAnthropic | None = None
+
+
+def get_client() -> anthropic.AsyncAnthropic:
+    """Return the shared Anthropic client, creating it on first use.
+
+    One client per process keeps the underlying httpx connection pool (and its
+    keep-alive connections to api.anthropic.com) warm across requests.
+    """
+    global _client
+    if _client is None:
+        _client = anthropic.AsyncAnthropic(
+            api_key=os.environ["ANTHROPIC_API_KEY"],
+            http_client=anthropic.DefaultAsyncHttpxClient(http2=True, limits=HTTP_LIMITS),
+        )
+    return _client
+
 
 MODEL = "claude-sonnet-4-6"
 MAX_TOKENS = 4096
 
+
+# ---------------------------------------------------------------------------
+# Rate limiting — self-pace under the account's RPM / input-TPM limits
+# rather than hitting 429s and backing off.
+# ---------------------------------------------------------------------------
+class RateLimiter:
+    """
+    Request and token buckets plus an in-flight cap, shared by all calls in
+    this process. Each bucket refills continuously at its per-minute rate; a
+    limit of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_min: int = 0, tokens_per_min: int = 0, max_concurrent: int = 0):
+        self.requests_per_min = requests_per_min
+        self.tokens_per_min = tokens_per_min
+        self._requests = float(requests_per_min)
+        self._tokens = float(tokens_per_min)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO, so waiters are served in arrival order
+        self._semaphore = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        if self.requests_per_min:
+            self._requests = min(self.requests_per_min, self._requests + elapsed * self.requests_per_min / 60)
+        if self.tokens_per_min:
+            self._tokens = min(self.tokens_per_min, self._tokens + elapsed * self.tokens_per_min / 60)
+
+    async def _take(self, tokens: int) -> None:
+        if not (self.requests_per_min or self.tokens_per_min):
+            return
+        # A single call larger than the whole bucket would otherwise wait forever
+        tokens = min(tokens, self.tokens_per_min)
+        async with self._lock:
+            while True:
+                self._refill()
+                waits = []
+                if self.requests_per_min and self._requests < 1:
+                    waits.append((1 - self._requests) * 60 / self.requests_per_min)
+                if self.tokens_per_min and self._tokens < tokens:
+                    waits.append((tokens - self._tokens) * 60 / self.tokens_per_min)
+                if not waits:
+                    break
+                await asyncio.sleep(max(waits))
+            if self.requests_per_min:
+                self._requests -= 1
+            if self.tokens_per_min:
+                self._tokens -= tokens
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, estimated_tokens: int) -> AsyncIterator[None]:
+        """Wait for bucket capacity (and an in-flight slot) before making one call."""
+        if self._semaphore is None:
+            await self._take(estimated_tokens)
+            yield
+            return
+        async with self._semaphore:
+            await self._take(estimated_tokens)
+            yield
+
+
+# Limits are per process — divide the account's limits by WEB_CONCURRENCY.
+limiter = RateLimiter(
+    requests_per_min=int(os.environ.get("ANTHROPIC_REQUESTS_PER_MIN", "0")),
+    tokens_per_min=int(os.environ.get("ANTHROPIC_INPUT_TOKENS_PER_MIN", "0")),
+    max_concurrent=int(os.environ.get("ANTHROPIC_MAX_CONCURRENT", "0")),
+)
+
+
+def _estimate_input_tokens(messages: list[dict]) -> int:
+    """Rough input size (~4 chars per token) of system prompt, tools and messages."""
+    return (len(SYSTEM_PROMPT) + _TOOLS_CHARS + len(str(messages))) // 4
+
 # ---------------------------------------------------------------------------
 # System prompt
 # ---------------------------------------------------------------------------
@@ -47,6 +146,31 @@ When answering:
 You have tools to look up live Booth data. Always use them when the question is about specific courses, requirements, or bids.
 """
 
+# The system prompt and tool schemas are identical on every call, so mark the
+# system block as a prompt-cache breakpoint. Anthropic caches tools + system as
+# one prefix; only the conversation after it is billed/processed at full cost.
+SYSTEM_BLOCKS = [
+    {"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+]
+
+# Batch requests run without tools, so they get a prompt that doesn't promise
+# any and tells Claude to be upfront that it can't see live Booth data.
+BATCH_SYSTEM_PROMPT = """You are HarperBot, a friendly and knowledgeable assistant for students at the University of Chicago Booth School of Business. You are named after Harper Center, Booth's home.
+
+You are answering in offline batch mode: you have NO tools and NO access to live Booth data (course schedules, instructors, enrollment, bid history, or the current degree and concentration requirements).
+
+When answering:
+1. Answer from general knowledge and the conversation so far only
+2. Never invent specific course numbers, schedules, instructors, room locations, or bid point values
+3. If a question needs live Booth data, say so plainly and suggest asking HarperBot in the live chat
+4. Keep answers concise but complete — use bullet points or tables for lists
+5. Be warm and supportive — Booth can be stressful!
+"""
+
+BATCH_SYSTEM_BLOCKS = [
+    {"type": "text", "text": BATCH_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+]
+
 # ---------------------------------------------------------------------------
 # Tool definitions (Claude tool_use schema)
 # ---------------------------------------------------------------------------
@@ -180,6 +304,9 @@ TOOLS = [
     },
 ]
 
+_TOOLS_CHARS = len(json.dumps(TOOLS))
+
+
 # ---------------------------------------------------------------------------
 # Tool dispatcher
 # ---------------------------------------------------------------------------
@@ -206,10 +333,32 @@ def _execute_tool(name: str, inputs: dict) -> str:
         return f"Tool error in {name}: {str(e)}"
 
 
+async def _run_tool_blocks(tool_use_blocks: list, tool_calls_log: list[dict]) -> list[dict]:
+    """Execute tool_use blocks, append them to the log, and return tool_result blocks.
+
+    Tools are synchronous pandas lookups (the first call also loads the CSVs),
+    so they run in a worker thread to keep the event loop free.
+    """
+    tool_results = []
+    for block in tool_use_blocks:
+        result = await asyncio.to_thread(_execute_tool, block.name, block.input)
+        tool_calls_log.append({
+            "tool": block.name,
+            "input": block.input,
+            "result_preview": result[:200] + "..." if len(result) > 200 else result,
+        })
+        tool_results.append({
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": result,
+        })
+    return tool_results
+
+
 # ---------------------------------------------------------------------------
 # Agent loop
 # ---------------------------------------------------------------------------
-def run_agent(user_message: str, conversation_history: list[dict]) -> dict[str, Any]:
+async def run_agent(user_message: str, conversation_history: list[dict]) -> dict[str, Any]:
     """
     Run the Claude agent with tool_use loop.
 
@@ -218,20 +367,24 @@ def run_agent(user_message: str, conversation_history: list[dict]) -> dict[str,
         conversation_history: List of prior {role, content} messages (for multi-turn)
 
     Returns:
-        dict with 'response' (str), 'tool_calls' (list), 'updated_history' (list)
+        dict with 'response' (str), 'tool_calls' (list), 'updated_history' (list),
+        'hit_iteration_limit' (bool — True when 'response' is the canned limit message)
     """
     messages = conversation_history + [{"role": "user", "content": user_message}]
     tool_calls_log = []
     max_iterations = 10  # Safety limit
 
+    client = get_client()
+
     for _ in range(max_iterations):
-        response = client.messages.create(
-            model=MODEL,
-            max_tokens=MAX_TOKENS,
-            system=SYSTEM_PROMPT,
-            tools=TOOLS,
-            messages=messages,
-        )
+        async with limiter.acquire(_estimate_input_tokens(messages)):
+            response = await client.messages.create(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                system=SYSTEM_BLOCKS,
+                tools=TOOLS,
+                messages=messages,
+            )
 
         # Collect tool use blocks
         tool_use_blocks = [b for b in response.content if b.type == "tool_use"]
@@ -248,22 +401,11 @@ def run_agent(user_message: str, conversation_history: list[dict]) -> dict[str,
                 "response": final_response,
                 "tool_calls": tool_calls_log,
                 "updated_history": updated_history,
+                "hit_iteration_limit": False,
             }
 
         # Execute all tool calls
-        tool_results = []
-        for block in tool_use_blocks:
-            result = _execute_tool(block.name, block.input)
-            tool_calls_log.append({
-                "tool": block.name,
-                "input": block.input,
-                "result_preview": result[:200] + "..." if len(result) > 200 else result,
-            })
-            tool_results.append({
-                "type": "tool_result",
-                "tool_use_id": block.id,
-                "content": result,
-            })
+        tool_results = await _run_tool_blocks(tool_use_blocks, tool_calls_log)
 
         # Add assistant turn (with tool_use blocks) and tool results to messages
         messages = messages + [
@@ -275,4 +417,137 @@ def run_agent(user_message: str, conversation_history: list[dict]) -> dict[str,
         "response": "I hit my iteration limit. Please try rephrasing your question.",
         "tool_calls": tool_calls_log,
         "updated_history": messages,
+        "hit_iteration_limit": True,
+    }
+
+
+async def stream_agent(user_message: str, conversation_history: list[dict]) -> AsyncIterator[dict[str, Any]]:
+    """
+    Streaming variant of run_agent: same tool loop, but yields events as they happen.
+
+    Events:
+        {"type": "text", "text": str}          — a text delta from Claude (any turn)
+        {"type": "tool_call", ...}             — a tool call log entry, once executed
+        {"type": "done", "response": str, "tool_calls": list}
+                                               — final answer, same shape as run_agent
+    """
+    messages = conversation_history + [{"role": "user", "content": user_message}]
+    tool_calls_log = []
+    max_iterations = 10  # Safety limit
+
+    client = get_client()
+
+    for _ in range(max_iterations):
+        async with limiter.acquire(_estimate_input_tokens(messages)):
+            async with client.messages.stream(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                system=SYSTEM_BLOCKS,
+                tools=TOOLS,
+                messages=messages,
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield {"type": "text", "text": text}
+                response = await stream.get_final_message()
+
+        tool_use_blocks = [b for b in response.content if b.type == "tool_use"]
+
+        if response.stop_reason == "end_turn" or not tool_use_blocks:
+            text_blocks = [b for b in response.content if b.type == "text"]
+            yield {
+                "type": "done",
+                "response": text_blocks[-1].text if text_blocks else "I couldn't generate a response.",
+                "tool_calls": tool_calls_log,
+            }
+            return
+
+        logged = len(tool_calls_log)
+        tool_results = await _run_tool_blocks(tool_use_blocks, tool_calls_log)
+        for entry in tool_calls_log[logged:]:
+            yield {"type": "tool_call", **entry}
+
+        messages = messages + [
+            {"role": "assistant", "content": response.content},
+            {"role": "user", "content": tool_results},
+        ]
+
+    yield {
+        "type": "done",
+        "response": "I hit my iteration limit. Please try rephrasing your question.",
+        "tool_calls": tool_calls_log,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Batch API — non-interactive jobs at half price, off the online rate limits
+# ---------------------------------------------------------------------------
+async def submit_batch(turns: list[tuple[str, list[dict]]]) -> dict[str, Any]:
+    """
+    Submit chat turns to the Anthropic Message Batches API.
+
+    Batch requests are single-turn: there is no tool loop, so answers come
+    from the model and the supplied history only, under BATCH_SYSTEM_PROMPT,
+    which tells Claude it has no live Booth data. Results are keyed by
+    custom_id "turn-<index>" in submission order.
+
+    Args:
+        turns: List of (user_message, conversation_history) pairs
+
+    Returns:
+        dict with 'batch_id' (str), 'status' (str), 'request_counts' (dict)
+    """
+    requests = [
+        {
+            "custom_id": f"turn-{i}",
+            "params": {
+                "model": MODEL,
+                "max_tokens": MAX_TOKENS,
+                "system": BATCH_SYSTEM_BLOCKS,
+                "messages": history + [{"role": "user", "content": message}],
+            },
+        }
+        for i, (message, history) in enumerate(turns)
+    ]
+    batch = await get_client().messages.batches.create(requests=requests)
+    return {
+        "batch_id": batch.id,
+        "status": batch.processing_status,
+        "request_counts": batch.request_counts.model_dump(),
+    }
+
+
+async def get_batch(batch_id: str) -> dict[str, Any]:
+    """
+    Poll a submitted batch. Once processing has ended, include its results.
+
+    Returns:
+        dict with 'batch_id', 'status', 'request_counts' and 'results' — a list
+        of {custom_id, response, error}, empty until the batch has ended
+    """
+    client = get_client()
+    batch = await client.messages.batches.retrieve(batch_id)
+    results = []
+
+    if batch.processing_status == "ended":
+        async for entry in await client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                text_blocks = [b for b in entry.result.message.content if b.type == "text"]
+                results.append({
+                    "custom_id": entry.custom_id,
+                    "response": text_blocks[-1].text if text_blocks else "",
+                    "error": None,
+                })
+            else:
+                results.append({
+                    "custom_id": entry.custom_id,
+                    "response": None,
+                    "error": entry.result.type,  # errored / canceled / expired
+                })
+        results.sort(key=lambda r: int(r["custom_id"].split("-")[1]))
+
+    return {
+        "batch_id": batch.id,
+        "status": batch.processing_status,
+        "request_counts": batch.request_counts.model_dump(),
+        "results": results,
     }
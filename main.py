@@ -3,15 +3,23 @@ HarperBot API — FastAPI backend
 Endpoint: POST /api/chat
 """
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import Literal, Optional
+from aiocache import Cache
+from aiocache.serializers import PickleSerializer
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from agent import run_agent
+import anthropic
+from agent import MODEL, run_agent, stream_agent, submit_batch, get_batch
 
 # ---------------------------------------------------------------------------
 # App setup
@@ -23,28 +31,93 @@ app = FastAPI(
 )
 
 # CORS — allow your Vercel frontend and localhost during dev
-ALLOWED_ORIGINS = os.environ.get(
-    "ALLOWED_ORIGINS",
-    "http://localhost:3000,http://localhost:5173,https://harperbot.com,https://www.harperbot.com",
-).split(",")
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get(
+        "ALLOWED_ORIGINS",
+        "http://localhost:3000,http://localhost:5173,https://harperbot.com,https://www.harperbot.com",
+    ).split(",")
+    if origin.strip()
+]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Tighten after launch
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    # cache-control: clients may send no-cache / no-store to /api/chat
+    allow_headers=["content-type", "authorization", "cache-control"],
+    max_age=86400,  # let browsers reuse a preflight result for 24h
 )
 
+# ---------------------------------------------------------------------------
+# Response cache — identical (history, message) pairs reuse the last answer.
+# Uses Redis when REDIS_URL is set (shared across workers), else in-memory.
+# ---------------------------------------------------------------------------
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "300"))  # seconds, 0 disables
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    _redis = urlparse(REDIS_URL)
+    response_cache = Cache(
+        Cache.REDIS,
+        endpoint=_redis.hostname or "localhost",
+        port=_redis.port or 6379,
+        password=_redis.password,
+        db=int(_redis.path.lstrip("/") or 0),
+        namespace="harperbot",
+        serializer=PickleSerializer(),
+    )
+else:
+    response_cache = Cache(Cache.MEMORY, namespace="harperbot")
+
+
+def _cache_key(message: str, history: list[dict]) -> str:
+    """Content-addressed key for a chat turn: sha256 of model + history + message."""
+    payload = json.dumps(
+        {"model": MODEL, "history": history, "message": message},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return "chat:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Request coalescing — concurrent identical turns share one agent run
+# ---------------------------------------------------------------------------
+_inflight: dict[str, asyncio.Task] = {}
+
+
+async def _run_agent_coalesced(key: str, message: str, history: list[dict]) -> dict:
+    """Run the agent once per key; callers arriving mid-flight await the same task."""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(run_agent(message, history))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    # shield: one caller going away must not cancel the run for the others
+    return await asyncio.shield(task)
+
+
 # ---------------------------------------------------------------------------
 # Request / Response models
 # ---------------------------------------------------------------------------
+# Request bodies are immutable once parsed (and hashable when every field is):
+# frozen rejects attribute assignment. extra="ignore" and validate_assignment=False are
+# Pydantic's defaults, stated here so the contract is explicit.
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", validate_assignment=False, frozen=True)
+
+
 class Message(BaseModel):
-    role: str  # "user" or "assistant"
+    model_config = REQUEST_MODEL_CONFIG
+
+    role: Literal["user", "assistant"]
     content: str
 
 
 class ChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     message: str
     conversation_history: Optional[list[Message]] = []
 
@@ -54,6 +127,25 @@ class ChatResponse(BaseModel):
     tool_calls: list[dict]
 
 
+class BatchChatRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
+    requests: list[ChatRequest]
+
+
+class BatchResult(BaseModel):
+    custom_id: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    status: str  # "in_progress", "canceling" or "ended"
+    request_counts: dict[str, int]
+    results: list[BatchResult] = []
+
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
@@ -62,13 +154,17 @@ def root():
     return {"status": "ok", "service": "HarperBot API"}
 
 
+# Polled by Railway's healthcheck — encode the body once, not on every probe
+_HEALTH_BODY = json.dumps({"status": "healthy", "model": MODEL}, separators=(",", ":")).encode()
+
+
 @app.get("/health")
-def health():
-    return {"status": "healthy", "model": "claude-sonnet-4-6"}
+async def health():
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest, cache_control: Optional[str] = Header(default=None)):
     """
     Main chat endpoint.
 
@@ -80,6 +176,10 @@ def chat(req: ChatRequest):
 
     Note: Only include text-based messages in history (not raw tool use blocks).
     The frontend should store conversation history and send it back each turn.
+
+    Responses are cached for RESPONSE_CACHE_TTL seconds. Send
+    `Cache-Control: no-cache` to force a fresh answer, or `no-store` to
+    bypass the cache entirely.
     """
     if not req.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
@@ -87,17 +187,127 @@ def chat(req: ChatRequest):
     # Convert Pydantic models to plain dicts for the agent
     history = [{"role": m.role, "content": m.content} for m in (req.conversation_history or [])]
 
+    directives = (cache_control or "").lower()
+    read_cache = RESPONSE_CACHE_TTL > 0 and "no-cache" not in directives and "no-store" not in directives
+    write_cache = RESPONSE_CACHE_TTL > 0 and "no-store" not in directives
+    key = _cache_key(req.message, history)
+
+    if read_cache:
+        try:
+            cached = await response_cache.get(key)
+        except Exception:
+            cached = None  # A cache outage should never fail the request
+        if cached is not None:
+            return ChatResponse(**cached)
+
     try:
-        result = run_agent(req.message, history)
+        result = await _run_agent_coalesced(key, req.message, history)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent error: {str(e)}")
 
+    # Only cache real final answers, not the canned iteration-limit reply
+    if write_cache and not result["hit_iteration_limit"]:
+        try:
+            await response_cache.set(
+                key,
+                {"response": result["response"], "tool_calls": result["tool_calls"]},
+                ttl=RESPONSE_CACHE_TTL,
+            )
+        except Exception:
+            pass
+
     return ChatResponse(
         response=result["response"],
         tool_calls=result["tool_calls"],
     )
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Streaming chat endpoint (Server-Sent Events).
+
+    Same request body as /api/chat. Each event is a `data: <json>` line:
+      {"type": "text", "text": "..."}                      — text as Claude writes it
+      {"type": "tool_call", "tool": ..., "input": ..., "result_preview": ...}
+      {"type": "done", "response": "...", "tool_calls": [...]}
+      {"type": "error", "detail": "..."}                   — instead of "done" on failure
+
+    Text from turns before a tool call is streamed too; "done" carries the
+    final answer on its own, matching /api/chat's "response".
+    """
+    if not req.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+
+    history = [{"role": m.role, "content": m.content} for m in (req.conversation_history or [])]
+
+    async def events():
+        try:
+            async for event in stream_agent(req.message, history):
+                yield f"data: {json.dumps(event, default=str)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'detail': f'Agent error: {str(e)}'})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Each turn is a full Sonnet call, and this route bypasses agent.limiter
+MAX_BATCH_REQUESTS = int(os.environ.get("MAX_BATCH_REQUESTS", "100"))
+
+
+@app.post("/api/chat/batch", response_model=BatchStatusResponse)
+async def chat_batch(req: BatchChatRequest):
+    """
+    Submit many chat turns as one asynchronous batch (bulk evals, enrichment).
+
+    Batches cost half as much as /api/chat and use a separate rate-limit pool,
+    but complete within 24 hours rather than immediately, and run without
+    tools (single model turn each). Batch answers have no access to live
+    Booth data — course schedules, bid history and requirements are not
+    looked up, and the model is told to say so rather than guess. At most
+    MAX_BATCH_REQUESTS turns per batch. Poll GET /api/chat/batch/{batch_id}
+    for results; result custom_ids are "turn-<index>" in submission order.
+    """
+    if not req.requests:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one request.")
+    if len(req.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(req.requests)} requests (max {MAX_BATCH_REQUESTS}).",
+        )
+    if any(not r.message.strip() for r in req.requests):
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+
+    turns = [
+        (r.message, [{"role": m.role, "content": m.content} for m in (r.conversation_history or [])])
+        for r in req.requests
+    ]
+
+    try:
+        result = await submit_batch(turns)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch error: {str(e)}")
+
+    return BatchStatusResponse(**result)
+
+
+@app.get("/api/chat/batch/{batch_id}", response_model=BatchStatusResponse)
+async def chat_batch_status(batch_id: str):
+    """Return a batch's status, plus per-turn results once it has ended."""
+    try:
+        result = await get_batch(batch_id)
+    except anthropic.NotFoundError:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch error: {str(e)}")
+
+    return BatchStatusResponse(**result)
+
+
 @app.get("/api/examples")
 def get_examples():
     """Return example questions for the frontend to display."""
@@ -115,3 +325,18 @@ def get_examples():
             "What courses has Stefan Nagel taught?",
         ]
     }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # uvloop + httptools ship with uvicorn[standard]. Workers come from
+    # WEB_CONCURRENCY (default 1, as in the Procfile); each loads its own DataFrames.
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8000")),
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        loop="uvloop",
+        http="httptools",
+    )
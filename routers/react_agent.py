@@ -1,81 +1,172 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Literal, Optional
+from functools import lru_cache
+import asyncio
 import os
+import httpx
+import openai
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 
-# Load environment variables
+# Load environment variables once, at import
 load_dotenv()
+OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+ANTHROPIC_KEY = os.getenv("ANTHROPIC_API_KEY")
 
-# Import tools
-import sys
-sys.path.append('src')
 from react_agent.tools import get_tools
 
 router = APIRouter()
 
+# Tools are fixed at import, so the whole system prompt is static. Keeping it
+# free of per-request content lets the provider reuse its prompt cache; the
+# user's query goes in a separate message after it.
+_TOOLS = get_tools()
+_TOOLS_BY_NAME = {tool.name: tool for tool in _TOOLS}
+_TOOL_NAMES = ', '.join(_TOOLS_BY_NAME)
+
+_SYSTEM_PREAMBLE = f"""You are a helpful AI assistant that can reason about questions and use tools to find answers.
+
+Available tools: {_TOOL_NAMES}
+
+Think step by step about what you need to do to answer the user's question. You can use tools if needed.
+
+Please provide a clear, helpful answer. Call a tool whenever it would make your answer more accurate or current."""
+
+# Prebuilt per provider; Anthropic needs an explicit cache breakpoint, OpenAI
+# caches matching prefixes automatically
+_SYSTEM_MESSAGES = {
+    "openai": SystemMessage(content=_SYSTEM_PREAMBLE),
+    "anthropic": SystemMessage(content=[
+        {"type": "text", "text": _SYSTEM_PREAMBLE, "cache_control": {"type": "ephemeral"}}
+    ]),
+}
+
+# Same request-body contract as main.REQUEST_MODEL_CONFIG (not imported, to
+# keep this router independent of the HarperBot app): immutable (hashable when
+# every field is), with Pydantic's extra/assignment defaults stated explicitly.
+REQUEST_MODEL_CONFIG = ConfigDict(extra="ignore", validate_assignment=False, frozen=True)
+
 # Pydantic models for request/response validation
 class ReActRequest(BaseModel):
+    model_config = REQUEST_MODEL_CONFIG
+
     query: str = Field(..., description="User's question or request")
     model: str = Field(default="gpt-4", description="Model to use (gpt-4, claude-3-sonnet-20240229)")
-    max_iterations: int = Field(default=3, description="Maximum reasoning iterations")
+    max_iterations: int = Field(default=3, ge=1, le=10, description="Maximum reasoning iterations (1-10)")
 
 class ReActResponse(BaseModel):
     answer: str = Field(..., description="Agent's final answer")
     reasoning_steps: List[str] = Field(default=[], description="Steps taken by the agent")
     tools_used: List[str] = Field(default=[], description="Tools used by the agent")
 
-def create_simple_react_agent(query: str, model: str = "gpt-4", max_iterations: int = 3):
+# One HTTP/2 pool shared by every cached OpenAI chat model. Same sizing as
+# agent.HTTP_LIMITS — keep them in step; not imported, so this router doesn't
+# pull in the HarperBot agent and its pandas tools.
+_HTTP_LIMITS = httpx.Limits(max_connections=500, max_keepalive_connections=200, keepalive_expiry=60)
+_OPENAI_HTTP_CLIENT = openai.DefaultAsyncHttpxClient(http2=True, limits=_HTTP_LIMITS)
+
+
+@lru_cache(maxsize=8)
+def get_llm(provider: str, model: str, temperature: float):
     """
-    Simple ReAct agent implementation that doesn't require complex LangGraph setup.
+    Return a chat model client with the tools bound, built once per
+    (provider, model, temperature). Reusing the instance keeps its HTTP
+    connection pool warm across requests.
     """
-    # Initialize the model
-    if model.startswith("gpt"):
+    if provider == "openai":
         llm = ChatOpenAI(
             model=model,
-            temperature=0.2,
-            api_key=os.getenv("OPENAI_API_KEY")
-        )
-    elif model.startswith("claude"):
-        llm = ChatAnthropic(
-            model=model,
-            temperature=0.2,
-            api_key=os.getenv("ANTHROPIC_API_KEY")
+            temperature=temperature,
+            api_key=OPENAI_KEY,
+            http_async_client=_OPENAI_HTTP_CLIENT,
         )
+    elif provider == "anthropic":
+        llm = ChatAnthropic(model=model, temperature=temperature, api_key=ANTHROPIC_KEY)
     else:
-        raise ValueError(f"Unsupported model: {model}")
-    
-    # Get available tools
-    tools = get_tools()
-    tool_names = [tool.name for tool in tools]
-    
-    # Create system prompt
-    system_prompt = f"""You are a helpful AI assistant that can reason about questions and use tools to find answers.
+        raise ValueError(f"Unsupported provider: {provider}")
+    return llm.bind_tools(_TOOLS)
 
-Available tools: {', '.join(tool_names)}
 
-Think step by step about what you need to do to answer the user's question. You can use tools if needed.
+def _provider_for(model: str) -> str:
+    if model.startswith("gpt"):
+        return "openai"
+    if model.startswith("claude"):
+        return "anthropic"
+    raise ValueError(f"Unsupported model: {model}")
 
-User question: {query}
 
-Please provide a clear, helpful answer. If you need to use a tool, mention which one you would use and why."""
-    
-    # Get response from LLM
+def _message_text(message: AIMessage) -> str:
+    """Text of an AI message; content is a list of blocks when it also carries tool calls."""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+async def _run_tool_call(tool_call: dict) -> str:
+    """Execute one structured tool call and return its result as a string."""
+    tool = _TOOLS_BY_NAME.get(tool_call["name"])
+    if tool is None:
+        return f"Unknown tool: {tool_call['name']}"
+    try:
+        return str(await tool.ainvoke(tool_call["args"]))
+    except Exception as e:
+        return f"Tool error in {tool_call['name']}: {str(e)}"
+
+
+async def create_simple_react_agent(query: str, model: str = "gpt-4", max_iterations: int = 3):
+    """
+    Simple ReAct agent implementation that doesn't require complex LangGraph setup.
+
+    Each iteration is one model call. The model requests tools through native
+    structured tool calls (AIMessage.tool_calls), so there is no output parsing;
+    results go back as ToolMessages until it answers without calling a tool.
+    """
+    # Get the (cached) model client
+    provider = _provider_for(model)
+    llm = get_llm(provider, model, 0.2)
+
+    # Static system prompt first (cacheable), dynamic query last
     messages = [
-        HumanMessage(content=system_prompt)
+        _SYSTEM_MESSAGES[provider],
+        HumanMessage(content=query)
     ]
     
-    response = llm.invoke(messages)
-    
-    # For now, return a simple response
-    # In a full implementation, you would parse the response and execute tools
+    reasoning_steps = []
+    tools_used = []
+
+    for _ in range(max_iterations):
+        response = await llm.ainvoke(messages)
+        messages.append(response)
+
+        text = _message_text(response)
+        if text:
+            reasoning_steps.append(text)
+
+        if not response.tool_calls:
+            return {
+                "answer": text,
+                "reasoning_steps": reasoning_steps,
+                "tools_used": tools_used
+            }
+
+        # Tool calls within one step are independent; run them concurrently
+        results = await asyncio.gather(*(_run_tool_call(tc) for tc in response.tool_calls))
+        for tool_call, result in zip(response.tool_calls, results):
+            if tool_call["name"] in _TOOLS_BY_NAME:
+                tools_used.append(tool_call["name"])
+            messages.append(ToolMessage(content=result, tool_call_id=tool_call["id"]))
+
     return {
-        "answer": response.content,
-        "reasoning_steps": [response.content],
-        "tools_used": []
+        "answer": "I hit my iteration limit. Please try rephrasing your question.",
+        "reasoning_steps": reasoning_steps,
+        "tools_used": tools_used
     }
 
 @router.post("/react", response_model=ReActResponse)
@@ -91,7 +182,7 @@ async def react_agent(request: ReActRequest):
     """
     try:
         # Validate API key
-        api_key = os.getenv("OPENAI_API_KEY") if request.model.startswith("gpt") else os.getenv("ANTHROPIC_API_KEY")
+        api_key = OPENAI_KEY if request.model.startswith("gpt") else ANTHROPIC_KEY
         if not api_key:
             raise HTTPException(
                 status_code=500,
@@ -99,7 +190,7 @@ async def react_agent(request: ReActRequest):
             )
         
         # Use simple ReAct agent for now
-        result = create_simple_react_agent(
+        result = await create_simple_react_agent(
             query=request.query,
             model=request.model,
             max_iterations=request.max_iterations
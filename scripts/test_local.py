@@ -4,6 +4,7 @@ Quick smoke test — run from the api/ directory:
 
 Requires ANTHROPIC_API_KEY in .env or environment.
 """
+import asyncio
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -39,6 +40,6 @@ print()
 print("=== Agent Test (LLM call) ===\n")
 from agent import run_agent
 
-result = run_agent("What courses can I take to fulfill the Decisions requirement?", [])
+result = asyncio.run(run_agent("What courses can I take to fulfill the Decisions requirement?", []))
 print("Response:", result["response"][:500])
 print("Tools used:", [t["tool"] for t in result["tool_calls"]])
@@ -0,0 +1 @@
+# ReAct Agent Package
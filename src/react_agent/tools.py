@@ -3,7 +3,10 @@ Tools for the ReAct agent.
 """
 
 from langchain_core.tools import tool
+from functools import lru_cache
+import ast
 import math
+import operator
 import datetime
 
 # Try to import Tavily, but provide fallback if not available
@@ -14,8 +17,18 @@ except ImportError:
     TAVILY_AVAILABLE = False
 
 
+@lru_cache(maxsize=1)
+def _get_search_tool():
+    """Build the Tavily client once and reuse it (and its HTTP session) for every search.
+
+    Built on first use rather than at import, because the constructor fails
+    when TAVILY_API_KEY is unset and the other tools should still load.
+    """
+    return TavilySearchResults(max_results=3)
+
+
 @tool
-def search_web(query: str) -> str:
+async def search_web(query: str) -> str:
     """
     Search the web for current information.
     
@@ -29,13 +42,62 @@ def search_web(query: str) -> str:
         return f"Web search not available. Please install tavily-python and set TAVILY_API_KEY. Query was: {query}"
     
     try:
-        search_tool = TavilySearchResults(max_results=3)
-        results = search_tool.invoke(query)
+        results = await _get_search_tool().ainvoke(query)
         return str(results)
     except Exception as e:
         return f"Search failed: {str(e)}"
 
 
+# Big-int exponentiation holds the GIL, so `9**9**9` would stall the worker
+_MAX_EXPONENT = 1000
+_MAX_POW_BITS = 10_000
+
+
+def _safe_pow(base, exponent):
+    """operator.pow, refusing exponents or integer results too large to compute quickly."""
+    if abs(exponent) > _MAX_EXPONENT:
+        raise ValueError(f"Exponent too large (max {_MAX_EXPONENT})")
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 \
+            and base.bit_length() * exponent > _MAX_POW_BITS:
+        raise ValueError("Result too large")
+    return operator.pow(base, exponent)
+
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+@lru_cache(maxsize=1024)
+def _parse_expression(expression: str) -> ast.Expression:
+    """Parse an arithmetic expression once; repeat queries skip the parser."""
+    return ast.parse(expression, mode="eval")
+
+
+def _eval_node(node: ast.AST):
+    """Evaluate an arithmetic AST, rejecting anything but numbers and operators."""
+    if isinstance(node, ast.Expression):
+        return _eval_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        return _BINARY_OPS[type(node.op)](_eval_node(node.left), _eval_node(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_eval_node(node.operand))
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
+
+
 @tool
 def calculator(expression: str) -> str:
     """
@@ -53,7 +115,7 @@ def calculator(expression: str) -> str:
         if not all(c in allowed_chars for c in expression):
             return "Error: Invalid characters in expression"
         
-        result = eval(expression)
+        result = _eval_node(_parse_expression(expression))
         return str(result)
     except Exception as e:
         return f"Calculation error: {str(e)}"
@@ -86,11 +148,15 @@ def weather_lookup(city: str) -> str:
     return f"Weather information for {city}: This is a placeholder. In a real implementation, you would integrate with a weather API like OpenWeatherMap."
 
 
+# Built once at import; @tool schemas are generated a single time per process
+TOOLS = (
+    search_web,
+    calculator,
+    get_current_time,
+    weather_lookup,
+)
+
+
 def get_tools():
     """Get all available tools."""
-    return [
-        search_web,
-        calculator,
-        get_current_time,
-        weather_lookup
-    ]
+    return TOOLS